@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
-import re
+import gzip
+import hashlib
+import json
+import os
 import sys
 import uuid
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 from dateutil import parser as dtparse
 from dateutil import tz
 
@@ -13,6 +21,9 @@ from dateutil import tz
 # ------------
 SITE_TZ = tz.gettz("America/New_York")
 DEFAULT_EVENT_DURATION_HOURS = 2
+FETCH_WORKERS = 16
+HTTP_CACHE_DIR = ".http_cache"
+HTTP_CACHE_INDEX = os.path.join(HTTP_CACHE_DIR, "index.json")
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                   "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -35,52 +46,166 @@ VENUES = [
     },
 ]
 
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.3),
+    ),
+)
+
+# url -> {"etag", "last_modified", "body_path"}, persisted between runs
+HTTP_CACHE = {}
+
+
+HTML_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+CARDS_XPATH = etree.XPath(
+    f"//div[{_has_class('event-listing')}]"
+    f" | //li[{_has_class('event-listing')}]"
+    f" | //a[{_has_class('event')}]"
+)
+EVENT_LINKS_XPATH = etree.XPath("//a[contains(@href, '/event/')]")
+TITLE_XPATH = etree.XPath(".//h3 | .//h2")
+LINK_XPATH = etree.XPath("descendant-or-self::a[@href]")
+DATE_XPATH = etree.XPath(
+    "(.//time | .//span)[contains(translate(@class, 'DATE', 'date'), 'date')]"
+)
+TIME_XPATH = etree.XPath(
+    ".//span[contains(translate(@class, 'TIME', 'time'), 'time')]"
+)
+
 
 # ------------
 # HELPERS
 # ------------
+ICS_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    ";": "\\;",
+    ",": "\\,",
+    "\n": "\\n",
+})
+
+
 def escape_ics(text: str) -> str:
+    return (text or "").translate(ICS_ESCAPES)
+
+
+def utc_stamp(dt):
+    u = dt.astimezone(tz.UTC)
     return (
-        (text or "")
-        .replace("\\", "\\\\")
-        .replace(";", "\\;")
-        .replace(",", "\\,")
-        .replace("\n", "\\n")
+        f"{u.year:04d}{u.month:02d}{u.day:02d}"
+        f"T{u.hour:02d}{u.minute:02d}{u.second:02d}Z"
     )
 
 
+def load_http_cache():
+    try:
+        with open(HTTP_CACHE_INDEX, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_http_cache():
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    with open(HTTP_CACHE_INDEX, "w", encoding="utf-8") as f:
+        json.dump(HTTP_CACHE, f, indent=2)
+
+
 def fetch_html(url):
-    resp = requests.get(url, headers=HEADERS, timeout=25)
+    headers = {}
+    entry = HTTP_CACHE.get(url)
+    if entry and os.path.exists(entry["body_path"]):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    resp = SESSION.get(url, headers=headers, timeout=25)
+    if resp.status_code == 304 and headers:
+        with gzip.open(entry["body_path"], "rt", encoding="utf-8") as f:
+            return f.read()
     resp.raise_for_status()
+    # Ticketmaster always serves UTF-8; skip requests' charset fallback
+    resp.encoding = "utf-8"
+
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    if etag or last_modified:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        body_path = os.path.join(
+            HTTP_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html.gz"
+        )
+        with gzip.open(body_path, "wt", encoding="utf-8") as f:
+            f.write(resp.text)
+        HTTP_CACHE[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_path": body_path,
+        }
     return resp.text
 
 
+def _safe_fetch(url):
+    try:
+        return fetch_html(url), None
+    except Exception as e:
+        return None, e
+
+
+def _first(xpath, el):
+    found = xpath(el)
+    return found[0] if found else None
+
+
+def _text(el):
+    return "".join(s.strip() for s in el.itertext())
+
+
 def parse_ticketmaster_events(html, prefix):
-    soup = BeautifulSoup(html, "html.parser")
+    # Every card selector needs "event" in a class or href; skip the parse
+    if "event" not in html:
+        return []
+
+    # Parse bytes: lxml rejects str input that carries an XML declaration
+    tree = lxml_html.document_fromstring(html.encode("utf-8"), parser=HTML_PARSER)
+    # bs4's get_text() never included script/style text; keep titles clean
+    etree.strip_elements(tree, "script", "style", with_tail=False)
     events = []
+    seen = set()
+    duration = timedelta(hours=DEFAULT_EVENT_DURATION_HOURS)
 
-    cards = soup.select("div.event-listing, li.event-listing, a.event")
+    cards = CARDS_XPATH(tree)
     if not cards:
-        cards = soup.select("a[href*='/event/']")
+        cards = EVENT_LINKS_XPATH(tree)
 
     for card in cards:
-        title_el = card.find(["h3", "h2"]) or card
-        title = title_el.get_text(strip=True) if title_el else None
+        title_el = _first(TITLE_XPATH, card)
+        title = _text(title_el if title_el is not None else card)
         if not title:
             continue
         title = f"{prefix}{title}"
 
         link = None
-        a = card.find("a", href=True)
-        if a and "/event/" in a["href"]:
-            link = a["href"]
+        a = _first(LINK_XPATH, card)
+        if a is not None and "/event/" in a.get("href"):
+            link = a.get("href")
             if link.startswith("/"):
                 link = f"https://www.ticketmaster.com{link}"
 
-        date_el = card.find(["time", "span"], class_=re.compile("date", re.I))
-        date_txt = date_el.get_text(strip=True) if date_el else None
-        time_el = card.find(["span"], class_=re.compile("time", re.I))
-        time_txt = time_el.get_text(strip=True) if time_el else ""
+        date_el = _first(DATE_XPATH, card)
+        date_txt = _text(date_el) if date_el is not None else None
+        time_el = _first(TIME_XPATH, card)
+        time_txt = _text(time_el) if time_el is not None else ""
 
         if not date_txt:
             continue
@@ -89,7 +214,12 @@ def parse_ticketmaster_events(html, prefix):
         if not dt:
             continue
 
-        end_dt = dt + timedelta(hours=DEFAULT_EVENT_DURATION_HOURS)
+        key = (title, dt, link)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        end_dt = dt + duration
         events.append(
             {
                 "title": title,
@@ -102,6 +232,7 @@ def parse_ticketmaster_events(html, prefix):
     return events
 
 
+@lru_cache(maxsize=2048)
 def parse_date_time(date_str, time_str):
     try:
         base = dtparse.parse(date_str)
@@ -113,39 +244,43 @@ def parse_date_time(date_str, time_str):
         return None
 
 
-def write_ics(events, path, venue_name):
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        f"PRODID:-//asm-ics//EN",
-        "CALSCALE:GREGORIAN",
-        "METHOD:PUBLISH",
-        f"X-WR-CALNAME:{venue_name}",
-        "X-WR-TIMEZONE:America/New_York",
-    ]
+def iter_ics(events, venue_name):
+    yield "BEGIN:VCALENDAR\n"
+    yield "VERSION:2.0\n"
+    yield "PRODID:-//asm-ics//EN\n"
+    yield "CALSCALE:GREGORIAN\n"
+    yield "METHOD:PUBLISH\n"
+    yield f"X-WR-CALNAME:{venue_name}\n"
+    yield "X-WR-TIMEZONE:America/New_York\n"
+
+    dtstamp = utc_stamp(datetime.now(tz=tz.UTC))
 
     for e in sorted(events, key=lambda x: x["start"]):
-        uid = f"{uuid.uuid4()}@asm-ics"
-        dtstamp = datetime.now(tz=tz.UTC).strftime("%Y%m%dT%H%M%SZ")
-        dtstart = e["start"].astimezone(tz.UTC).strftime("%Y%m%dT%H%M%SZ")
-        dtend = e["end"].astimezone(tz.UTC).strftime("%Y%m%dT%H%M%SZ")
-
-        lines.extend([
-            "BEGIN:VEVENT",
-            f"UID:{uid}",
-            f"DTSTAMP:{dtstamp}",
-            f"DTSTART:{dtstart}",
-            f"DTEND:{dtend}",
-            f"SUMMARY:{escape_ics(e['title'])}",
-        ])
-        if e["url"]:
-            lines.append(f"URL:{escape_ics(e['url'])}")
-        lines.append("END:VEVENT")
-
-    lines.append("END:VCALENDAR")
-
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
+        uid_key = f"{e['title']}|{e['start'].isoformat()}|{e['url'] or ''}"
+        uid = f"{uuid.uuid5(uuid.NAMESPACE_URL, uid_key)}@asm-ics"
+        dtstart = utc_stamp(e["start"])
+        dtend = utc_stamp(e["end"])
+
+        url_line = f"URL:{escape_ics(e['url'])}\n" if e["url"] else ""
+
+        yield (
+            "BEGIN:VEVENT\n"
+            f"UID:{uid}\n"
+            f"DTSTAMP:{dtstamp}\n"
+            f"DTSTART:{dtstart}\n"
+            f"DTEND:{dtend}\n"
+            f"SUMMARY:{escape_ics(e['title'])}\n"
+            f"{url_line}"
+            "END:VEVENT\n"
+        )
+
+    yield "END:VCALENDAR\n"
+
+
+def write_ics(events, path, venue_name):
+    # RFC 5545 requires CRLF line endings
+    with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+        f.writelines(iter_ics(events, venue_name))
     print(f"Wrote {path} with {len(events)} events")
 
 
@@ -153,17 +288,24 @@ def write_ics(events, path, venue_name):
 # MAIN
 # ------------
 def main():
-    for v in VENUES:
-        print(f"Fetching: {v['url']}")
-        try:
-            html = fetch_html(v["url"])
-            events = parse_ticketmaster_events(html, v["prefix"])
-            if not events:
-                print(f"No events parsed for {v['url']}")
+    HTTP_CACHE.update(load_http_cache())
+    urls = [v["url"] for v in VENUES]
+    for url in urls:
+        print(f"Fetching: {url}")
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls))) as ex:
+        for v, (html, err) in zip(VENUES, ex.map(_safe_fetch, urls)):
+            if err:
+                print(f"Error fetching {v['url']}: {err}")
                 continue
-            write_ics(events, v["outfile"], v["prefix"].strip(": "))
-        except Exception as e:
-            print(f"Error parsing {v['url']}: {e}")
+            try:
+                events = parse_ticketmaster_events(html, v["prefix"])
+                if not events:
+                    print(f"No events parsed for {v['url']}")
+                    continue
+                write_ics(events, v["outfile"], v["prefix"].strip(": "))
+            except Exception as e:
+                print(f"Error parsing {v['url']}: {e}")
+    save_http_cache()
 
 
 if __name__ == "__main__":